@@ -31,8 +31,10 @@ import pytz
 import requests
 from xml.etree import ElementTree as ET
 import time
+import threading
 
-from .exception import ExceptionFactory
+from .exception import ExceptionFactory, is_session_exception
+from .schema import Schema
 
 
 def hide_string(s, char_replace='*'):
@@ -205,28 +207,157 @@ class Date(BaseObject):
 class ObjectFactory(object):
     """A factory (see pattern factory) which can create Resource, Trainee, Room,
     Instructor, Project, Activity, Event, Cost, Caracteristic, Date object"""
+    resource_objects = {
+        'resource': Resource,
+        'trainee': Trainee,
+        'room': Room,
+        'instructor': Instructor,
+        'project': Project,
+        'activity': Activity,
+        'event': Event,
+        'cost': Cost,
+        'caracteristic': Caracteristic,
+        'date': Date,
+    }
+
     def create_object(self, typ, **kwargs):
-        resource_objects = {
-            'resource': Resource,
-            'trainee': Trainee,
-            'room': Room,
-            'instructor': Instructor,
-            'project': Project,
-            'activity': Activity,
-            'event': Event,
-            'cost': Cost,
-            'caracteristic': Caracteristic,
-            'date': Date,
-        }
-        return(resource_objects[typ](**kwargs))
+        return(self.resource_objects[typ](**kwargs))
+
+
+class IdentityMap(ObjectFactory):
+    """A factory which creates only one object per id (for a project)
+
+    Resources, activities and events are shared between calls.
+    Resources of events and activities (resources attribute) are resolved
+    to shared Resource objects. Resources which are not already known
+    are fetched using only one getResources call (per batch of ids)."""
+    shared_types = ['activity', 'event']
+    batch_size = 100
+
+    def __init__(self, api=None, project=None, detail=13):
+        self.api = api
+        self.project = project
+        self.detail = detail
+        self._lock = threading.RLock()
+        self.resources = {}  # id -> Resource
+        self.activities = {}  # id -> Activity
+        self.events = {}  # id -> Event
+
+    def _objects(self, typ):
+        """Returns dict of shared objects for a given type (None if not shared)"""
+        if typ == 'activity':
+            return(self.activities)
+        elif typ == 'event':
+            return(self.events)
+        elif typ in ['project', 'cost', 'caracteristic', 'date']:
+            return(None)
+        else:  # resource (or ADE category such as classroom, equipment...)
+            return(self.resources)
+
+    def create_object(self, typ, **kwargs):
+        """Returns shared object (updated with kwargs) if id is already known"""
+        objects = self._objects(typ)
+        if objects is None or 'id' not in kwargs.keys():
+            return(super(IdentityMap, self).create_object(typ, **kwargs))
+        id = int(kwargs['id'])
+        with self._lock:
+            obj = objects.get(id)
+            if obj is None:
+                cls = self.resource_objects.get(typ, Resource)
+                if objects is self.resources and 'category' in kwargs.keys():
+                    cls = self.resource_objects.get(kwargs['category'], cls)
+                obj = cls(**kwargs)
+                objects[id] = obj
+            else:
+                obj.__dict__.update(kwargs)
+        return(obj)
+
+    def create_objects(self, typ, lst):
+        """Returns list of shared objects from a list of dict
+        (resources of activities and events are resolved before objects
+        are created or updated so other threads never see unresolved resources)"""
+        if typ in self.shared_types:
+            lst = self.resolve(lst)
+        return([self.create_object(typ, **d) for d in lst])
+
+    def fetch(self, ids):
+        """Fetch resources (using only one call per batch of ids)"""
+        ids = sorted(set(int(id) for id in ids))
+        for i in range(0, len(ids), self.batch_size):
+            batch = ids[i:i + self.batch_size]
+            lst = self.api.getResources(id='|'.join(str(id) for id in batch),
+                detail=self.detail, project=self.project, objects=False)
+            for d in lst:
+                self.create_object(d.get('category', 'resource'), **d)
+
+    def resolve(self, lst):
+        """Returns a copy of a list of dict (attributes of activities or events)
+        where resources (list of dict with id) are replaced by shared Resource objects"""
+        missing = set()
+        for d in lst:
+            for resource in d.get('resources', []):
+                id = int(resource['id'])
+                if id not in self.resources:
+                    missing.add(id)
+        if missing and self.api is not None:
+            self.fetch(missing)
+        resolved = []
+        for d in lst:
+            d = dict(d)
+            if 'resources' in d.keys():
+                resources = []
+                for resource in d['resources']:
+                    if isinstance(resource, Resource):
+                        resources.append(resource)
+                        continue
+                    id = int(resource['id'])
+                    shared = self.resources.get(id)
+                    if shared is None:  # not found on server: use attributes of event/activity
+                        shared = self.create_object(resource.get('category', 'resource'), **resource)
+                    resources.append(shared)
+                d['resources'] = resources
+            resolved.append(d)
+        return(resolved)
+
+    def _get_list(self, function, typ, kwargs):
+        """Returns shared objects of a get function of api
+        (project and objects are set by identity map)"""
+        for key in ['project', 'objects']:
+            if key in kwargs.keys():
+                raise(TypeError("%s() of an identity map doesn't accept %s "
+                    "(identity map of project %s returns objects)" % (function, key, self.project)))
+        lst = getattr(self.api, function)(project=self.project, objects=False, **kwargs)
+        return(self.create_objects(typ, lst))
+
+    def getResources(self, **kwargs):
+        """Returns shared resource(s) (see ADEWebAPI.getResources)"""
+        return(self._get_list('getResources', kwargs.get('category', 'resource'), kwargs))
+
+    def getActivities(self, **kwargs):
+        """Returns shared activity(ies) (see ADEWebAPI.getActivities)"""
+        return(self._get_list('getActivities', 'activity', kwargs))
+
+    def getEvents(self, **kwargs):
+        """Returns shared event(s) (see ADEWebAPI.getEvents)"""
+        return(self._get_list('getEvents', 'event', kwargs))
 
 
 class ADEWebAPI():
-    """Class to manage ADE Web API (reader only)"""
-    def __init__(self, url, login, password):
+    """Class to manage ADE Web API (reader only)
+
+    An instance can be shared by several threads: methods return lists
+    (not lazy iterators) and options can be given per call instead of
+    using global toggles:
+
+     * objects=True/False: list of objects or list of dict
+     * decode=True/False: decode attributes using schema
+     * project=projectId: use a session dedicated to this project
+       (instead of current project set using setProject)"""
+    def __init__(self, url, login, password, timeout=None):
         self.url = url
         self.login = login
         self.password = password
+        self.timeout = timeout  # seconds (None: no timeout)
         
         self.sessionId = None
         
@@ -234,6 +365,7 @@ class ADEWebAPI():
 
         self.factory = ObjectFactory()
         self.exception_factory = ExceptionFactory()
+        self.schema = Schema()
 
         self.opt_params = {
             'connect': set([]), 
@@ -261,30 +393,100 @@ class ADEWebAPI():
                     'manager',  'codeX', 'codeY', 'codeZ', 'info', 'detail'])
         }
 
+        self._lock = threading.RLock()
+        self._project_sessions = {}  # projectId -> sessionId
+        self._project_locks = {}  # projectId -> lock used while opening its session
+        self._first_dates = {}  # projectId (None: current project) -> date
+        self._identity_maps = {}  # projectId (None: current project) -> IdentityMap
+
         self._project_init()
 
         self.create_list_of_objects(False)
+        self.decode_attributes(False)
 
     def _project_init(self):
-        self._first_date = None
+        with self._lock:
+            self._first_dates.pop(None, None)
+            self._identity_maps.pop(None, None)
+
+    def identity_map(self, project=None):
+        """Returns identity map of current project (or of a given project)
+        Its getResources, getActivities, getEvents methods return shared objects"""
+        if project is not None:
+            project = str(project)
+        with self._lock:
+            identity_map = self._identity_maps.get(project)
+            if identity_map is None:
+                identity_map = IdentityMap(self, project)
+                self._identity_maps[project] = identity_map
+            return(identity_map)
 
     def create_list_of_objects(self, flag):
-        if flag:
-            self._create_list_of = self._create_list_of_objects
+        """Default output of methods: list of objects (True) or list of dict (False)
+        (can be given per call using objects=...)"""
+        self._objects = bool(flag)
+
+    def decode_attributes(self, flag):
+        """Decode attributes (int, bool, interned str...) using schema
+        instead of returning them as str
+        (can be given per call using decode=...)"""
+        self._decode = bool(flag)
+
+    def _pop_options(self, kwargs):
+        """Removes per-call options (objects, decode, project) from kwargs
+        and returns them (using default values of instance)"""
+        objects = kwargs.pop('objects', None)
+        if objects is None:
+            objects = self._objects
+        decode = kwargs.pop('decode', None)
+        if decode is None:
+            decode = self._decode
+        project = kwargs.pop('project', None)
+        return(objects, decode, project)
+
+    def _attributes(self, category, elt, decode=None):
+        """Returns attributes of XML element"""
+        if decode is None:
+            decode = self._decode
+        if decode:
+            return(self._decoded_attributes(category, elt))
         else:
-            self._create_list_of = self._create_list_of_dicts
+            return(self._raw_attributes(category, elt))
+
+    def _raw_attributes(self, category, elt):
+        """Returns attributes of XML element (as str)"""
+        d = dict(elt.attrib)
+        resources = elt.find('resources')
+        if resources is not None:
+            d['resources'] = [dict(r.attrib) for r in resources.findall('resource')]
+        return(d)
+
+    def _decoded_attributes(self, category, elt):
+        """Returns attributes of XML element decoded using schema"""
+        d = self.schema.decode(category, elt.attrib)
+        resources = elt.find('resources')
+        if resources is not None:
+            d['resources'] = [self.schema.decode(r.attrib.get('category', 'resource'), r.attrib)
+                for r in resources.findall('resource')]
+        return(d)
+
+    def _get(self, params):
+        """Send a GET request to server and returns response"""
+        self.logger.debug("send %s" % hide_dict_values(params))
+        response = requests.get(self.url, params=params, timeout=self.timeout)
+        self.logger.debug(response)
+        return(response)
 
     def _send_request(self, func, **params):
         """Send a request"""
         params['function'] = func
 
         if 'sessionId' not in params.keys():
-            if self.sessionId is not None:
-                params['sessionId'] = self.sessionId
+            sessionId = self.sessionId
+            if sessionId is not None:
+                params['sessionId'] = sessionId
         
-        self.logger.debug("send %s" % hide_dict_values(params))
-        response = requests.get(self.url, params=params)
-        self.logger.debug(response)
+        response = self._get(params)
         self.logger.debug(response.text)
         element = ET.fromstring(response.text)
 
@@ -298,21 +500,101 @@ class ADEWebAPI():
         if element.tag=='error':
             self.exception_factory.raise_from_xml(element)
 
+    def _session(self, project=None):
+        """Returns sessionId to use for a given project
+        (a dedicated session is opened once for each project)
+        or sessionId of current session if project is None"""
+        if project is None:
+            return(self.sessionId)
+        project = str(project)
+        with self._lock:
+            sessionId = self._project_sessions.get(project)
+            if sessionId is not None:
+                return(sessionId)
+            project_lock = self._project_locks.setdefault(project, threading.Lock())
+
+        # login outside of self._lock (only threads using this project wait)
+        with project_lock:
+            with self._lock:
+                sessionId = self._project_sessions.get(project)
+            if sessionId is not None:
+                return(sessionId)
+            element = self._send_request('connect',
+                login=self.login, password=self.password)
+            sessionId = element.attrib["id"]
+            try:
+                element = self._send_request('setProject',
+                    projectId=project, sessionId=sessionId)
+                if element.attrib["projectId"] != project:
+                    raise(Exception("Can't set project %s" % project))
+            except:
+                try:
+                    self._send_request('disconnect', sessionId=sessionId)
+                except Exception:
+                    self.logger.warning("can't disconnect session %s" % sessionId)
+                raise
+            with self._lock:
+                self._project_sessions[project] = sessionId
+            return(sessionId)
+
+    def _drop_session(self, project, sessionId):
+        """Forgets session of a project (expired on server side)"""
+        with self._lock:
+            if self._project_sessions.get(project) == sessionId:
+                del self._project_sessions[project]
+
+    def _send_project_request(self, func, project=None, **params):
+        """Send a request using session of a project (or current session
+        if project is None)
+        If session of project expired on server side, a new session
+        is opened and request is sent again"""
+        if project is None:
+            return(self._send_request(func, **params))
+        project = str(project)
+        for attempt in range(2):
+            sessionId = self._session(project)
+            try:
+                return(self._send_request(func, sessionId=sessionId, **params))
+            except Exception as e:
+                if attempt > 0 or not is_session_exception(e):
+                    raise
+                self._drop_session(project, sessionId)
+
     def connect(self):
         """Connect to server"""
         function = 'connect'
         element = self._send_request(function,
             login=self.login, password=self.password)
         returned_sessionId = element.attrib["id"]
-        self.sessionId = returned_sessionId
+        with self._lock:
+            self.sessionId = returned_sessionId
         return(returned_sessionId is not None)
 
     def disconnect(self):
-        """Disconnect from server"""
+        """Disconnect from server (and sessions of projects)"""
         function = 'disconnect'
-        element = self._send_request(function)
+        with self._lock:
+            project_sessions = self._project_sessions
+            self._project_sessions = {}
+            for project in project_sessions.keys():
+                self._first_dates.pop(project, None)
+                self._identity_maps.pop(project, None)
+        for project, sessionId in project_sessions.items():
+            try:
+                self._send_request(function, sessionId=sessionId)
+            except Exception as e:
+                self.logger.warning("can't disconnect session %s of project %s: %s"
+                    % (sessionId, project, e))
+
+        with self._lock:
+            sessionId = self.sessionId
+            self.sessionId = None
+        if sessionId is None:
+            return(True)
+        self._project_init()
+        element = self._send_request(function, sessionId=sessionId)
         returned_sessionId = element.attrib["sessionId"]
-        return(returned_sessionId == self.sessionId)
+        return(returned_sessionId == sessionId)
 
     def _test_opt_params(self, given_params, function):
         """Test if kwargs parameters are in allowed optional parameters
@@ -320,29 +602,45 @@ class ADEWebAPI():
         opt_params = self.opt_params[function]
         given_params = set(given_params.keys())
         msg = "One (or many) parameters of '%s' call are not allowed. %s is not in %s" \
-            % ('getResources', given_params-opt_params, opt_params)
+            % (function, given_params-opt_params, opt_params)
         assert given_params <= opt_params, msg
 
-    def _create_list_of_dicts(self, category, lst):
+    def _create_list_of(self, category, lst, objects=None, decode=None):
+        """Returns a list of objects or a list of dict"""
+        if objects is None:
+            objects = self._objects
+        if objects:
+            return(self._create_list_of_objects(category, lst, decode))
+        else:
+            return(self._create_list_of_dicts(category, lst, decode))
+
+    def _create_list_of_dicts(self, category, lst, decode=None):
         """Returns a list of dict (attributes of XML element)"""
-        return(map(lambda elt: elt.attrib, lst))
+        return([self._attributes(category, elt, decode) for elt in lst])
 
-    def _create_list_of_objects(self, category, lst):
+    def _create_list_of_objects(self, category, lst, decode=None):
         """Returns a list of object using factory"""
-        return(map(lambda elt: self.factory.create_object(category, **elt.attrib), lst))
+        return([self.factory.create_object(category, **self._attributes(category, elt, decode))
+            for elt in lst])
+
+    def _get_list(self, function, typ, kwargs):
+        """Send request and returns list of typ elements"""
+        objects, decode, project = self._pop_options(kwargs)
+        self._test_opt_params(kwargs, function)
+        element = self._send_project_request(function, project, **kwargs)
+        lst = element.findall(typ)
+        lst = self._create_list_of(typ, lst, objects, decode)
+        return(lst)
 
 #    def getProjects(self, detail=None, id=None):
     def getProjects(self, **kwargs):
         """Returns (list of) projects"""
         function = 'getProjects'
-#        element = self._send_request(function, detail=detail, id=id)
-        element = self._send_request(function, **kwargs)
-        lst_projects = element.findall('project')
-        lst_projects = self._create_list_of('project', lst_projects)
-        return(lst_projects)
+        return(self._get_list(function, 'project', kwargs))
                 
     def setProject(self, projectId):
-        """Set current project"""
+        """Set current project
+        (with several threads, prefer project=... per call)"""
         function = 'setProject'
         element = self._send_request(function, projectId=projectId)
         returned_projectId = element.attrib["projectId"]        
@@ -359,62 +657,39 @@ class ADEWebAPI():
     def getResources(self, **kwargs):
         """Returns resource(s) from several optional arguments"""
         function = 'getResources'
-        self._test_opt_params(kwargs, function)
-        element = self._send_request(function, **kwargs)
         if 'category' in kwargs.keys():
             category = kwargs['category']
         else:
             category = 'resource'
-        lst_resources = element.findall(category)
-        lst_resources = self._create_list_of(category, lst_resources)
-        return(lst_resources)
+        return(self._get_list(function, category, kwargs))
 
     def getActivities(self, **kwargs):
         """Returns activity(ies) from several optional arguments"""
         function = 'getActivities'
-        self._test_opt_params(kwargs, function)
-        typ = 'activity'
-        element = self._send_request(function, **kwargs)
-        lst_activities = element.findall(typ)
-        lst_activities = self._create_list_of(typ, lst_activities)
-        return(lst_activities)
+        return(self._get_list(function, 'activity', kwargs))
         
     def getEvents(self, **kwargs):
         """Returns event(s) from several optional arguments"""
         function = 'getEvents'
-        self._test_opt_params(kwargs, function)
-        typ = 'event'
-        element = self._send_request(function, **kwargs)
-        lst_events = element.findall(typ)
-        lst_events = self._create_list_of(typ, lst_events)
-        return(lst_events)
+        return(self._get_list(function, 'event', kwargs))
         
     def getCosts(self, **kwargs):
         """Returns cost(s) from several optional arguments"""
         function = 'getCosts'
-        self._test_opt_params(kwargs, function)
-        element = self._send_request(function, **kwargs)
-        typ = 'cost'
-        lst = element.findall(typ)
-        lst = self._create_list_of(typ, lst)
-        return(lst)
+        return(self._get_list(function, 'cost', kwargs))
 
     def getCaracteristics(self, **kwargs):
         """Returns caracteristic(s) from several optional arguments"""
         function = 'getCaracteristics'
-        self._test_opt_params(kwargs, function)
-        element = self._send_request(function, **kwargs)
-        typ = 'caracteristic'
-        lst = element.findall(typ)
-        lst = self._create_list_of(typ, lst)
-        return(lst)
+        return(self._get_list(function, 'caracteristic', kwargs))
         
-    def getDate(self, week, day, slot):
+    def getDate(self, week, day, slot, **kwargs):
         """Returns date object from week, day, slot"""
         function = 'getDate'
-#        self._test_opt_params(kwargs, function)  # no keyword arguments (kwargs)
-        element = self._send_request(function, week=week, day=day, slot=slot)
-        date = Date(**element.attrib)
+        objects, decode, project = self._pop_options(kwargs)
+        self._test_opt_params(kwargs, function)
+        element = self._send_project_request(function, project, week=week, day=day, slot=slot)
+        date = Date(**self._attributes('date', element, decode))
         return(date)
 
 #    def imageET(self, resources, weeks, days, **kwargs):
@@ -427,33 +702,53 @@ class ADEWebAPI():
 
 #        self._test_opt_params(kwargs, function)
 
-        if 'sessionId' not in kwargs.keys():
-            if self.sessionId is not None:
-                kwargs['sessionId'] = self.sessionId
-        self.logger.debug("send %s" % hide_dict_values(kwargs))
-        response = requests.get(self.url, params=kwargs)
-        try:
-            element = ET.fromstring(response.text)
-            xml_response = True
-        except:
-            xml_response = False
-
-        if xml_response:
-            self._parse_error(element)
-        else:  # binary response (gif)
-            return(response.content)
-
-    def first_date(self):
-        """Returns first date of current project"""
-        self._first_date = self.getDate(0, 0, 0)['time'].date()
-        return(self._first_date)
-
-    def week_id(self, date=datetime.date.today()):
-        """Returns week number for a given date"""
+        project = kwargs.pop('project', None)
+        for attempt in range(2):
+            params = dict(kwargs)
+            if 'sessionId' not in params.keys():
+                sessionId = self._session(project)
+                if sessionId is not None:
+                    params['sessionId'] = sessionId
+            response = self._get(params)
+            try:
+                element = ET.fromstring(response.text)
+                xml_response = True
+            except:
+                xml_response = False
+
+            if not xml_response:  # binary response (gif)
+                return(response.content)
+            try:
+                self._parse_error(element)
+                return
+            except Exception as e:
+                if project is None or 'sessionId' in kwargs.keys() \
+                        or attempt > 0 or not is_session_exception(e):
+                    raise
+                self._drop_session(str(project), params['sessionId'])
+
+    def first_date(self, project=None):
+        """Returns first date of current project (or of a given project)"""
+        if project is not None:
+            project = str(project)
+        first_date = self.getDate(0, 0, 0, project=project)['time'].date()
+        with self._lock:
+            self._first_dates[project] = first_date
+        return(first_date)
+
+    def week_id(self, date=None, project=None):
+        """Returns week number for a given date (default is today)"""
 #        week = ((date1-date0)/7).days
 
-        if self._first_date is None:
-            self._first_date = self.first_date()
+        if date is None:
+            date = datetime.date.today()
+        if project is not None:
+            project = str(project)
+
+        with self._lock:
+            first_date = self._first_dates.get(project)
+        if first_date is None:
+            first_date = self.first_date(project)
 
-        week = int((date-self._first_date).days/7)
+        week = int((date-first_date).days/7)
         return(week)
@@ -0,0 +1,231 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+
+"""
+    ADE Web API Availability
+
+    Copyright (C) 2011-2015 "Sébastien Celles" <s.celles@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>
+"""
+
+from functools import reduce
+
+
+def get_value(obj, key, default=None):
+    """Returns value of key from a dict or from an object (BaseObject)"""
+    try:
+        return(obj[key])
+    except (KeyError, AttributeError):
+        return(default)
+
+
+def get_resource_ids(obj):
+    """Returns list of resource ids (int) of an event or an activity"""
+    resources = get_value(obj, 'resources')
+    if resources is None:
+        return([])
+    return([int(get_value(resource, 'id')) for resource in resources])
+
+
+class SlotGrid(object):
+    """Maps (week, day, slot) to a bit position (absolute slot)
+    nb_days is number of days per week
+    nb_slots is number of slots per day (it depends on project,
+    see from_events to get it from events of project)"""
+    def __init__(self, nb_days=7, nb_slots=96):
+        self.nb_days = nb_days
+        self.nb_slots = nb_slots
+
+    @staticmethod
+    def from_events(events, nb_days=7):
+        """Returns grid of a project using absoluteSlot attribute of its events
+        (getEvents with detail)
+        Raises ValueError if number of slots per day can't be found"""
+        nb_slots = None
+        for event in events:
+            absolute_slot = get_value(event, 'absoluteSlot')
+            if absolute_slot is None:
+                continue
+            week_day = int(event['week'])*nb_days + int(event['day'])
+            if week_day == 0:
+                continue
+            n, remainder = divmod(int(absolute_slot) - int(event['slot']), week_day)
+            if remainder or (nb_slots is not None and n != nb_slots):
+                raise(ValueError("absoluteSlot of event %s is not consistent with %d days per week"
+                    % (get_value(event, 'id'), nb_days)))
+            nb_slots = n
+        if nb_slots is None:
+            raise(ValueError("can't find number of slots per day from events"))
+        return(SlotGrid(nb_days, nb_slots))
+
+    def position(self, week, day, slot):
+        """Returns absolute slot of (week, day, slot)
+        Raises ValueError if day or slot is out of range"""
+        week, day, slot = int(week), int(day), int(slot)
+        if week < 0 or not 0 <= day < self.nb_days or not 0 <= slot < self.nb_slots:
+            raise(ValueError("(week=%d, day=%d, slot=%d) out of range (%d days, %d slots per day)"
+                % (week, day, slot, self.nb_days, self.nb_slots)))
+        return((week*self.nb_days + day)*self.nb_slots + slot)
+
+    def interval(self, week, day, slot, duration=1):
+        """Returns (start, end) absolute slots (end excluded) of duration slots
+        starting at (week, day, slot)
+        Raises ValueError if duration is not positive
+        or if interval doesn't fit in the day"""
+        start = self.position(week, day, slot)
+        duration = int(duration)
+        if duration <= 0:
+            raise(ValueError("duration %d is not positive" % duration))
+        if int(slot) + duration > self.nb_slots:
+            raise(ValueError("duration %d from slot %s exceeds %d slots per day"
+                % (duration, slot, self.nb_slots)))
+        return((start, start + duration))
+
+    def event_interval(self, event):
+        """Returns (start, end) absolute slots of an event"""
+        return(self.interval(event['week'], event['day'], event['slot'],
+            get_value(event, 'duration', 1)))
+
+    def slot(self, position):
+        """Returns (week, day, slot) of an absolute slot"""
+        week_day, slot = divmod(position, self.nb_slots)
+        week, day = divmod(week_day, self.nb_days)
+        return((week, day, slot))
+
+    def mask(self, slots):
+        """Returns bitset from an iterable of (week, day, slot)"""
+        bitset = 0
+        for week, day, slot in slots:
+            bitset |= 1 << self.position(week, day, slot)
+        return(bitset)
+
+    def mask_range(self, week, day, slot, duration=1):
+        """Returns bitset of duration slots starting at (week, day, slot)"""
+        start, end = self.interval(week, day, slot, duration)
+        return(((1 << (end - start)) - 1) << start)
+
+    def mask_days(self, weeks, days, first_slot=0, last_slot=None):
+        """Returns bitset of slots from first_slot to last_slot (included)
+        of each day of each week"""
+        if last_slot is None:
+            last_slot = self.nb_slots - 1
+        duration = last_slot - first_slot + 1
+        bitset = 0
+        for week in weeks:
+            for day in days:
+                bitset |= self.mask_range(week, day, first_slot, duration)
+        return(bitset)
+
+    def event_mask(self, event):
+        """Returns bitset of slots used by an event"""
+        start, end = self.event_interval(event)
+        return(((1 << (end - start)) - 1) << start)
+
+    def slots(self, bitset):
+        """Returns list of (week, day, slot) of a bitset"""
+        lst = []
+        while bitset:
+            low = bitset & -bitset
+            lst.append(self.slot(low.bit_length() - 1))
+            bitset ^= low
+        return(lst)
+
+
+class AvailabilityIndex(object):
+    """Index of busy slots (one bitset per resource)
+    built from events (getEvents with detail to get resources of events)
+
+    Availability queries are then bitwise operations (AND/OR) on
+    bitsets instead of getEvents calls"""
+    def __init__(self, grid=None):
+        if grid is None:
+            grid = SlotGrid()
+        self.grid = grid
+        self.busy = {}  # resource id -> bitset of busy slots
+        self.resources = {}  # resource id -> resource (dict or object)
+
+    def add_resources(self, resources):
+        """Adds resources (getResources results) to index
+        (needed to filter on category or capacity)"""
+        for resource in resources:
+            resource_id = int(resource['id'])
+            self.resources[resource_id] = resource
+            self.busy.setdefault(resource_id, 0)
+
+    def add_event(self, event, resource_ids=None):
+        """Marks slots of an event as busy for its resources
+        (or for resource_ids if given)"""
+        self.add_events([event], resource_ids)
+
+    def add_events(self, events, resource_ids=None):
+        """Marks slots of events as busy
+        Raises ValueError (and index is not modified) if an event
+        doesn't fit in grid (see SlotGrid)"""
+        busy = {}
+        for event in events:
+            mask = self.grid.event_mask(event)
+            if resource_ids is None:
+                ids = get_resource_ids(event)
+            else:
+                ids = resource_ids
+            for resource_id in ids:
+                resource_id = int(resource_id)
+                busy[resource_id] = busy.get(resource_id, 0) | mask
+        for resource_id, mask in busy.items():
+            self.busy[resource_id] = self.busy.get(resource_id, 0) | mask
+
+    def busy_mask(self, resource_id):
+        """Returns bitset of busy slots of a resource"""
+        return(self.busy.get(int(resource_id), 0))
+
+    def is_free(self, resource_id, mask):
+        """Returns True if resource is free on every slot of mask"""
+        return(self.busy_mask(resource_id) & mask == 0)
+
+    def free_resources(self, mask, category=None, min_capacity=None, resource_ids=None):
+        """Returns list of resource ids which are free on every slot of mask
+        (optionally filtered by category and minimal capacity)"""
+        if resource_ids is None:
+            resource_ids = self.busy.keys()
+        lst = []
+        for resource_id in resource_ids:
+            resource_id = int(resource_id)
+            if self.busy.get(resource_id, 0) & mask:
+                continue
+            if category is not None or min_capacity is not None:
+                resource = self.resources.get(resource_id)
+                if resource is None:
+                    continue
+                if category is not None and get_value(resource, 'category') != category:
+                    continue
+                if min_capacity is not None:
+                    try:
+                        capacity = int(get_value(resource, 'capacity'))
+                    except (TypeError, ValueError):
+                        continue
+                    if capacity < min_capacity:
+                        continue
+            lst.append(resource_id)
+        return(sorted(lst))
+
+    def common_free(self, resource_ids, mask):
+        """Returns bitset of slots of mask where every resource is free"""
+        busy = reduce(lambda a, b: a | b, (self.busy_mask(r) for r in resource_ids), 0)
+        return(mask & ~busy)
+
+    def any_free(self, resource_ids, mask):
+        """Returns bitset of slots of mask where at least one resource is free"""
+        busy = reduce(lambda a, b: a & b, (self.busy_mask(r) for r in resource_ids), mask)
+        return(mask & ~busy)
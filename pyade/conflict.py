@@ -0,0 +1,122 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+
+"""
+    ADE Web API Conflicts
+
+    Copyright (C) 2011-2015 "Sébastien Celles" <s.celles@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>
+"""
+
+import bisect
+import heapq
+from collections import namedtuple
+
+from .availability import SlotGrid, get_value
+
+
+class Conflict(namedtuple('Conflict', ['resource_id', 'event_id', 'other_event_id', 'start', 'end'])):
+    """Two events using the same resource
+    from absolute slot start to absolute slot end (excluded)"""
+    __slots__ = ()
+
+
+class ConflictDetector(object):
+    """Detects double-booked resources (rooms, instructors, trainees...)
+
+    Events are stored as intervals of absolute slots in a sorted list
+    per resource. Conflicts of a resource are found using a sweep
+    over its sorted intervals (O(n log n) instead of comparing events pairwise).
+    Only resources modified since last call are swept again."""
+    def __init__(self, grid=None):
+        if grid is None:
+            grid = SlotGrid()
+        self.grid = grid
+        self.events = {}  # event id -> (start, end, resource ids)
+        self.intervals = {}  # resource id -> sorted list of (start, end, event id)
+        self.categories = {}  # resource id -> category
+        self._conflicts = {}  # resource id -> list of conflicts
+        self._dirty = set()
+
+    def add_resources(self, resources):
+        """Adds category of resources (getResources results)"""
+        for resource in resources:
+            category = get_value(resource, 'category')
+            if category is not None:
+                self.categories[int(resource['id'])] = category
+
+    def add_event(self, event):
+        """Adds (or replaces) an event
+        Raises ValueError if event doesn't fit in grid (see SlotGrid)"""
+        event_id = int(event['id'])
+        start, end = self.grid.event_interval(event)
+        if event_id in self.events:
+            self.remove_event(event_id)
+        resource_ids = []
+        for resource in get_value(event, 'resources', []):
+            resource_id = int(resource['id'])
+            if resource_id in resource_ids:
+                continue
+            category = get_value(resource, 'category')
+            if category is not None:
+                self.categories[resource_id] = category
+            bisect.insort(self.intervals.setdefault(resource_id, []), (start, end, event_id))
+            self._dirty.add(resource_id)
+            resource_ids.append(resource_id)
+        self.events[event_id] = (start, end, resource_ids)
+
+    def remove_event(self, event_id):
+        """Removes an event"""
+        event_id = int(event_id)
+        start, end, resource_ids = self.events.pop(event_id)
+        for resource_id in resource_ids:
+            lst = self.intervals[resource_id]
+            i = bisect.bisect_left(lst, (start, end, event_id))
+            del lst[i]
+            self._dirty.add(resource_id)
+
+    def update(self, events):
+        """Adds (or replaces) events"""
+        for event in events:
+            self.add_event(event)
+
+    def _sweep(self, resource_id):
+        """Returns conflicts of a resource"""
+        lst = []
+        active = []  # heap of (end, event id)
+        for start, end, event_id in self.intervals.get(resource_id, []):
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            for other_end, other_event_id in active:
+                lst.append(Conflict(resource_id, other_event_id, event_id,
+                    start, min(end, other_end)))
+            heapq.heappush(active, (end, event_id))
+        return(lst)
+
+    def conflicts(self, category=None, resource_ids=None):
+        """Returns list of conflicts
+        (optionally only for a given category or for some resources)"""
+        for resource_id in self._dirty:
+            self._conflicts[resource_id] = self._sweep(resource_id)
+        self._dirty = set()
+
+        if resource_ids is None:
+            resource_ids = self._conflicts.keys()
+        lst = []
+        for resource_id in sorted(int(r) for r in resource_ids):
+            if category is not None and self.categories.get(resource_id) != category:
+                continue
+            lst.extend(self._conflicts.get(resource_id, []))
+        return(lst)
@@ -29,3 +29,9 @@ class ExceptionFactory(object):
     def raise_from_xml(self, xml_element):
         exc = self.create_from_xml(xml_element)
         raise(exc)
+
+
+def is_session_exception(e):
+    """Returns True if exception (raised from an XML error message)
+    is about session (expired or unknown session on server side)"""
+    return('session' in str(e).lower())
@@ -0,0 +1,516 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+
+"""
+    ADE Web API caching proxy
+
+    Copyright (C) 2011-2015 "Sébastien Celles" <s.celles@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+    Local HTTP service which speaks the ADE Web API protocol (?function=...)
+    and sits in front of the real server.
+    It uses a pool of authenticated sessions per login, caches responses
+    per login and per project and coalesces duplicate requests.
+
+    Clients connect with their own login and password, so they only get
+    data their login can see. Credentials are checked again against the
+    real server after auth_ttl seconds.
+    The proxy should only be reachable by trusted applications
+    (it listens on 127.0.0.1 by default).
+
+    Run it using:
+
+        $ python -m pyade.proxy --url https://server/jsp/webapi
+"""
+
+import logging
+import threading
+import hashlib
+import uuid
+import time
+from collections import OrderedDict
+from xml.etree import ElementTree as ET
+from xml.sax.saxutils import quoteattr
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qsl
+    from queue import Queue, Empty
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qsl
+    from Queue import Queue, Empty
+
+import click
+
+from . import ADEWebAPI, get_info
+from .exception import is_session_exception
+
+
+CACHED_FUNCTIONS = set(['getProjects', 'getResources', 'getActivities', 'getEvents',
+    'getCosts', 'getCaracteristics', 'getDate', 'imageET'])
+
+XML_CONTENT_TYPE = 'text/xml; charset=UTF-8'
+
+
+def xml_response(tag, **attrib):
+    """Returns a (content type, body) XML response"""
+    attributes = ''.join(' %s=%s' % (key, quoteattr(str(value)))
+        for key, value in sorted(attrib.items()))
+    body = '<?xml version="1.0" encoding="UTF-8"?>\n<%s%s/>\n' % (tag, attributes)
+    return((XML_CONTENT_TYPE, body.encode('utf-8')))
+
+
+def error_response(msg):
+    """Returns an XML error response (see ExceptionFactory)"""
+    return(xml_response('error', name='ProxyError', trace=msg))
+
+
+def is_error(content_type, content):
+    """Returns True if response is an XML error message"""
+    if 'xml' not in content_type:
+        return(False)
+    try:
+        return(ET.fromstring(content).tag == 'error')
+    except ET.ParseError:
+        return(False)
+
+
+def is_session_error(content_type, content):
+    """Returns True if response is an XML error about session
+    (expired or unknown session on server side)"""
+    if not is_error(content_type, content):
+        return(False)
+    element = ET.fromstring(content)
+    msg = ' '.join([element.attrib.get('name', ''), element.attrib.get('trace', '')])
+    return('session' in msg.lower())
+
+
+class SessionPool(object):
+    """Pool of authenticated ADEWebAPI sessions (of one login)
+    A session is used by only one thread at a time"""
+    def __init__(self, url, login, password, size=4, timeout=30):
+        self.url = url
+        self.login = login
+        self.password = password
+        self.size = size
+        self.timeout = timeout
+        self._queue = Queue()
+        self._projects = {}  # ADEWebAPI -> projectId
+        for i in range(size):
+            self._queue.put(None)  # sessions are connected lazily
+
+    def acquire(self, projectId):
+        """Returns a connected session with projectId as current project"""
+        try:
+            api = self._queue.get(timeout=self.timeout)
+        except Empty:
+            raise(Exception("No session available for %s" % self.login))
+        try:
+            if api is None:
+                api = ADEWebAPI(self.url, self.login, self.password, timeout=self.timeout)
+                api.connect()
+            if projectId is not None and self._projects.get(api) != projectId:
+                if not api.setProject(projectId):
+                    raise(Exception("Can't set project %s" % projectId))
+                self._projects[api] = projectId
+        except:
+            self.discard(api)
+            raise
+        return(api)
+
+    def release(self, api):
+        """Gives back a session to pool"""
+        self._queue.put(api)
+
+    def discard(self, api):
+        """Drops a session (expired or in error) and gives back its slot to pool"""
+        if api is not None:
+            self._projects.pop(api, None)
+            if api.sessionId is not None:
+                try:
+                    api.disconnect()
+                except:
+                    pass
+        self._queue.put(None)
+
+    def close(self):
+        """Disconnect every session"""
+        for i in range(self.size):
+            try:
+                api = self._queue.get(timeout=self.timeout)
+            except Empty:
+                logging.getLogger('ADEWebAPI').warning("session of %s still in use" % self.login)
+                continue
+            if api is not None:
+                try:
+                    api.disconnect()
+                except:
+                    logging.getLogger('ADEWebAPI').warning("can't disconnect session %s" % api.sessionId)
+            self._projects.pop(api, None)
+            self._queue.put(None)
+
+
+class ResponseCache(object):
+    """Cache of responses per scope (login, projectId)
+    Responses expire after ttl seconds (never if ttl is None)
+    Oldest responses are evicted when there are more than max_size responses"""
+    def __init__(self, ttl=300, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # (scope, key) -> (timestamp, response), oldest first
+
+    def _expired(self, timestamp, now):
+        return(self.ttl is not None and now - timestamp > self.ttl)
+
+    def get(self, scope, key):
+        with self._lock:
+            try:
+                timestamp, response = self._data[(scope, key)]
+            except KeyError:
+                return(None)
+            if self._expired(timestamp, time.time()):
+                del self._data[(scope, key)]
+                return(None)
+            return(response)
+
+    def set(self, scope, key, response):
+        now = time.time()
+        with self._lock:
+            self._data.pop((scope, key), None)
+            self._data[(scope, key)] = (now, response)
+            # responses are ordered by timestamp so expired ones are first
+            while self._data:
+                oldest = next(iter(self._data.values()))
+                if not self._expired(oldest[0], now) and len(self._data) <= self.max_size:
+                    break
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return(len(self._data))
+
+    def clear(self, login=None, projectId=None):
+        """Clear cache (of a given login and/or project or every response)"""
+        with self._lock:
+            for scope, key in list(self._data.keys()):
+                if (login is None or scope[0] == login) \
+                        and (projectId is None or scope[1] == projectId):
+                    del self._data[(scope, key)]
+
+
+class ADEProxy(object):
+    """Read-through caching proxy for ADE Web API
+
+    Clients connect, setProject and call functions like with the real server
+    but they get virtual sessions (which expire after session_ttl seconds
+    without request).
+    Requests are sent to server using a pool of sessions of the login of
+    the client, and responses are cached per login and per project.
+    Credentials are checked against the real server again after auth_ttl seconds.
+    timeout (seconds) is used for every request to server."""
+    def __init__(self, url, size=4, ttl=300, max_size=10000,
+            auth_ttl=300, session_ttl=3600, timeout=30):
+        self.url = url
+        self.size = size
+        self.cache = ResponseCache(ttl, max_size)
+        self.auth_ttl = auth_ttl
+        self.session_ttl = session_ttl
+        self.timeout = timeout
+        self.logger = logging.getLogger('ADEWebAPI')
+        self._lock = threading.Lock()
+        self._users = {}  # login -> [digest of credentials, time of check, SessionPool]
+        self._sessions = {}  # virtual sessionId -> [login, projectId, time of last request]
+        self._last_sweep = time.time()
+        self._inflight = {}  # (scope, key) -> [threading.Event, response]
+
+    def _check(self, login, password):
+        """Returns True if credentials are accepted by real server"""
+        api = ADEWebAPI(self.url, login, password, timeout=self.timeout)
+        try:
+            api.connect()
+            api.disconnect()
+        except Exception:
+            return(False)
+        return(True)
+
+    def _authenticate(self, login, password):
+        """Check credentials (against real server if they were not checked
+        since auth_ttl seconds) and returns True if they are valid"""
+        digest = hashlib.sha256(('%s\x00%s' % (login, password)).encode('utf-8')).hexdigest()
+        with self._lock:
+            user = self._users.get(login)
+        if user is not None and user[0] == digest and time.time() - user[1] < self.auth_ttl:
+            return(True)
+
+        if not self._check(login, password):
+            if user is not None and user[0] == digest:
+                self._revoke(login)
+            return(False)
+
+        with self._lock:
+            user = self._users.get(login)
+            if user is not None and user[0] == digest:
+                user[1] = time.time()
+                return(True)
+            self._users[login] = [digest, time.time(),
+                SessionPool(self.url, login, password, self.size, self.timeout)]
+        if user is not None:  # password changed
+            user[2].close()
+            self.cache.clear(login=login)
+        return(True)
+
+    def _revoke(self, login):
+        """Forget a login (credentials not valid anymore)"""
+        with self._lock:
+            user = self._users.pop(login, None)
+            for sessionId, session in list(self._sessions.items()):
+                if session[0] == login:
+                    del self._sessions[sessionId]
+        if user is not None:
+            user[2].close()
+        self.cache.clear(login=login)
+
+    def _pool(self, login):
+        """Returns pool of sessions of a login (None if credentials are not valid anymore)"""
+        with self._lock:
+            user = self._users.get(login)
+        if user is None:
+            return(None)
+        pool = user[2]
+        if time.time() - user[1] >= self.auth_ttl:
+            if not self._authenticate(login, pool.password):
+                return(None)
+            with self._lock:
+                user = self._users.get(login)
+            if user is None:
+                return(None)
+            pool = user[2]
+        return(pool)
+
+    def _sweep(self, now):
+        """Removes virtual sessions without request since session_ttl seconds"""
+        with self._lock:
+            if now - self._last_sweep < min(self.session_ttl, 60):
+                return
+            self._last_sweep = now
+            for sessionId, session in list(self._sessions.items()):
+                if now - session[2] > self.session_ttl:
+                    del self._sessions[sessionId]
+
+    def handle(self, params):
+        """Returns (content type, body) response of a request
+        params is a dict of query parameters"""
+        params = dict(params)
+        function = params.pop('function', None)
+        sessionId = params.pop('sessionId', None)
+        now = time.time()
+        self._sweep(now)
+
+        if function == 'connect':
+            login = params.get('login', '')
+            if not self._authenticate(login, params.get('password', '')):
+                return(error_response('Invalid login or password'))
+            sessionId = uuid.uuid4().hex
+            with self._lock:
+                self._sessions[sessionId] = [login, None, now]
+            return(xml_response('session', id=sessionId))
+
+        with self._lock:
+            session = self._sessions.get(sessionId)
+            if session is not None and now - session[2] > self.session_ttl:
+                del self._sessions[sessionId]
+                session = None
+            if session is None:
+                return(error_response('Invalid session %s' % sessionId))
+            session[2] = now
+            login, projectId = session[0], session[1]
+
+        if function == 'disconnect':
+            with self._lock:
+                self._sessions.pop(sessionId, None)
+            return(xml_response('disconnected', sessionId=sessionId))
+
+        if function == 'setProject':
+            projectId = params.get('projectId')
+            if not projectId:
+                return(error_response('Missing projectId'))
+            pool = self._pool(login)
+            if pool is None:
+                return(error_response('Invalid login or password'))
+            try:  # check that project exists and can be used by this login
+                pool.release(self._acquire(pool, projectId))
+            except Exception as e:
+                return(error_response(str(e)))
+            with self._lock:
+                session[1] = projectId
+            return(xml_response('setProject', sessionId=sessionId, projectId=projectId))
+
+        if function not in CACHED_FUNCTIONS:
+            return(error_response("Function '%s' is not allowed" % function))
+
+        if function == 'getProjects':
+            projectId = None  # projects don't depend on current project
+        elif projectId is None:
+            return(error_response("No project set (call setProject first)"))
+
+        if self._pool(login) is None:
+            with self._lock:
+                self._sessions.pop(sessionId, None)
+            return(error_response('Invalid login or password'))
+
+        params['function'] = function
+        return(self.fetch(login, projectId, params))
+
+    def fetch(self, login, projectId, params):
+        """Returns a response from cache or from real server
+        Only one request is sent to server for duplicate requests"""
+        scope = (login, projectId)
+        key = tuple(sorted(params.items()))
+        response = self.cache.get(scope, key)
+        if response is not None:
+            return(response)
+
+        with self._lock:
+            inflight = self._inflight.get((scope, key))
+            leader = inflight is None
+            if leader:
+                inflight = [threading.Event(), None]
+                self._inflight[(scope, key)] = inflight
+
+        event = inflight[0]
+        if not leader:
+            # leader may wait for a session, connect, set project and retry once
+            if not event.wait(4*self.timeout):
+                return(error_response('Timeout'))
+            response = inflight[1]
+            if response is not None:
+                return(response)
+            return(self._forward(login, projectId, params))
+
+        try:
+            response = self._forward(login, projectId, params)
+            if not is_error(*response):
+                self.cache.set(scope, key, response)
+            inflight[1] = response
+        finally:
+            with self._lock:
+                del self._inflight[(scope, key)]
+            event.set()
+        return(response)
+
+    def _acquire(self, pool, projectId):
+        """Returns a session of pool with projectId as current project
+        (a session which expired on server side is dropped and another one is used)"""
+        for attempt in range(2):
+            try:
+                return(pool.acquire(projectId))
+            except Exception as e:
+                if attempt > 0 or not is_session_exception(e):
+                    raise
+
+    def _forward(self, login, projectId, params):
+        """Send request to real server using a session of pool of login
+        (a session which expired on server side is dropped and request is sent again)"""
+        pool = self._pool(login)
+        if pool is None:
+            return(error_response('Invalid login or password'))
+        response = None
+        for attempt in range(2):
+            try:
+                api = pool.acquire(projectId)
+            except Exception as e:
+                response = error_response(str(e))
+                if is_session_exception(e):
+                    continue
+                return(response)
+            try:
+                request_params = dict(params)
+                request_params['sessionId'] = api.sessionId
+                r = api._get(request_params)
+                response = (r.headers.get('Content-Type', XML_CONTENT_TYPE), r.content)
+            except Exception as e:
+                pool.discard(api)
+                return(error_response(str(e)))
+            if is_session_error(*response):
+                pool.discard(api)
+                continue
+            pool.release(api)
+            return(response)
+        return(response)
+
+    def close(self):
+        """Disconnect every session of every pool"""
+        with self._lock:
+            users = list(self._users.values())
+            self._users = {}
+            self._sessions = {}
+        for user in users:
+            user[2].close()
+
+
+class ADEProxyRequestHandler(BaseHTTPRequestHandler):
+    """HTTP request handler (server.proxy is an ADEProxy)"""
+    def do_GET(self):
+        params = dict(parse_qsl(urlparse(self.path).query))
+        content_type, body = self.server.proxy.handle(params)
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.getLogger('ADEWebAPI').debug(format % args)
+
+
+class ADEProxyServer(ThreadingMixIn, HTTPServer):
+    """Threaded HTTP server for ADEProxy"""
+    daemon_threads = True
+
+    def __init__(self, proxy, host='127.0.0.1', port=8080):
+        HTTPServer.__init__(self, (host, port), ADEProxyRequestHandler)
+        self.proxy = proxy
+
+
+@click.command()
+@click.option("--url", default="", help="Server URL")
+@click.option("--host", default="127.0.0.1", help="Proxy host")
+@click.option("--port", default=8080, help="Proxy port")
+@click.option("--size", default=4, help="Number of sessions per login")
+@click.option("--ttl", default=300, help="Cache time to live (seconds)")
+@click.option("--max-size", default=10000, help="Maximum number of cached responses")
+@click.option("--auth-ttl", default=300, help="Delay before checking credentials again (seconds)")
+@click.option("--session-ttl", default=3600, help="Idle time before a client session expires (seconds)")
+@click.option("--timeout", default=30, help="Timeout of requests to server (seconds)")
+def main(url, host, port, size, ttl, max_size, auth_ttl, session_ttl, timeout):
+    url = get_info('url', url)
+    proxy = ADEProxy(url, size=size, ttl=ttl, max_size=max_size,
+        auth_ttl=auth_ttl, session_ttl=session_ttl, timeout=timeout)
+    server = ADEProxyServer(proxy, host, port)
+    print("ADE Web API proxy for %s on http://%s:%d/" % (url, host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        proxy.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+
+"""
+    ADE Web API Schema
+
+    Copyright (C) 2011-2015 "Sébastien Celles" <s.celles@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>
+"""
+
+try:
+    from sys import intern
+except ImportError:  # Python 2 (intern is a builtin)
+    pass
+
+
+def to_int(s):
+    """Converts a string attribute to int"""
+    return(int(s))
+
+
+def to_float(s):
+    """Converts a string attribute to float"""
+    return(float(s))
+
+
+def to_bool(s):
+    """Converts a string attribute ('true'/'false') to bool"""
+    value = s.lower()
+    if value == 'true':
+        return(True)
+    elif value == 'false':
+        return(False)
+    raise(ValueError("invalid boolean %r" % s))
+
+
+def to_interned(s):
+    """Returns an interned string (low-cardinality attributes such as
+    category, type or timezone are then shared instead of duplicated)"""
+    return(intern(str(s)))
+
+
+RESOURCE_SCHEMA = {
+    'id': to_int,
+    'fatherId': to_int,
+    'category': to_interned,
+    'type': to_interned,
+    'size': to_int,
+    'capacity': to_int,
+    'quantity': to_int,
+    'timezone': to_interned,
+    'jobCategory': to_interned,
+    'country': to_interned,
+    'state': to_interned,
+    'city': to_interned,
+    'zipCode': to_interned,
+    'isGroup': to_bool,
+    'consumer': to_bool,
+    'levelAccess': to_int,
+    'nbEventsPlaced': to_int,
+    'durationInMinutes': to_int,
+    'codeX': to_interned,
+    'codeY': to_interned,
+    'codeZ': to_interned,
+}
+
+ACTIVITY_SCHEMA = {
+    'id': to_int,
+    'type': to_interned,
+    'capacity': to_int,
+    'duration': to_float,
+    'repetition': to_int,
+    'timezone': to_interned,
+    'maxSeats': to_int,
+    'seatsLeft': to_int,
+    'seatseLeft': to_int,
+    'isEnabled': to_bool,
+    'nbEvents': to_int,
+    'nbEventsPlaced': to_int,
+    'codeX': to_interned,
+    'codeY': to_interned,
+    'codeZ': to_interned,
+}
+
+EVENT_SCHEMA = {
+    'id': to_int,
+    'activityId': to_int,
+    'session': to_int,
+    'repetition': to_int,
+    'week': to_int,
+    'day': to_int,
+    'slot': to_int,
+    'absoluteSlot': to_int,
+    'duration': to_int,
+    'startHour': to_interned,
+    'endHour': to_interned,
+    'color': to_interned,
+    'isLockPosition': to_bool,
+    'isLockResources': to_bool,
+    'isSoftKeepResources': to_bool,
+    'additionalResources': to_int,
+}
+
+PROJECT_SCHEMA = {
+    'id': to_int,
+    'version': to_int,
+    'loaded': to_bool,
+}
+
+SCHEMA = {
+    'resource': RESOURCE_SCHEMA,
+    'trainee': RESOURCE_SCHEMA,
+    'room': RESOURCE_SCHEMA,
+    'instructor': RESOURCE_SCHEMA,
+    'project': PROJECT_SCHEMA,
+    'activity': ACTIVITY_SCHEMA,
+    'event': EVENT_SCHEMA,
+    'cost': {'id': to_int},
+    'caracteristic': {'id': to_int},
+    'date': {'week': to_int, 'day': to_int, 'slot': to_int},
+}
+
+
+class Schema(object):
+    """Decodes attributes of XML elements (which are all strings)
+    to typed values (int, float, bool, interned str) according to
+    a per-category schema.
+    Categories which are not in schema (category5, equipment...)
+    are decoded using the resource schema."""
+    def __init__(self, schema=None, default='resource'):
+        if schema is None:
+            schema = SCHEMA
+        self.schema = schema
+        self.default = default
+
+    def get(self, category):
+        """Returns schema (dict field -> decoder) of a given category"""
+        try:
+            return(self.schema[category])
+        except KeyError:
+            return(self.schema[self.default])
+
+    def decode(self, category, attrib):
+        """Returns a new dict with decoded values.
+        Values which can't be decoded are kept as string"""
+        schema = self.get(category)
+        d = {}
+        for key, value in attrib.items():
+            try:
+                decoder = schema[key]
+            except KeyError:
+                d[key] = value
+                continue
+            try:
+                d[key] = decoder(value)
+            except ValueError:
+                d[key] = value
+        return(d)
@@ -0,0 +1,400 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+
+"""
+    ADE Web API Snapshot
+
+    Copyright (C) 2011-2015 "Sébastien Celles" <s.celles@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>
+
+    Binary snapshot of resources, activities and events which can be
+    memory-mapped and queried read-only (without deserializing) by several
+    processes sharing the same copy of data in RAM.
+
+    File format (little-endian, arrays are aligned on 8 bytes):
+
+     * header: magic, version, number of tables, offset of string table
+     * table directory: name, number of rows, number of columns,
+       offset of column descriptors, offset of id index
+     * column descriptors: name, kind, offset of data (and offset of ids
+       for 'r' columns)
+     * columns: one array per column
+        - 'i': int64 (INT_NULL for missing values or empty strings)
+        - 'f': float64 (NaN for missing values or empty strings)
+        - 'b': int8 (-1 for missing values or empty strings)
+        - 's': uint32 index in string table (STR_NULL for missing values)
+        - 'r': uint32 offsets (number of rows + 1) in an int64 array of ids
+     * id index: int64 sorted ids followed by uint32 row numbers
+     * string table: number of strings, uint32 offsets, UTF-8 data
+"""
+
+import os
+import mmap
+import struct
+import bisect
+
+from .availability import get_value
+
+
+MAGIC = b'PYADESNP'
+VERSION = 1
+
+INT_NULL = -2**63
+STR_NULL = 2**32 - 1
+BOOL_NULL = -1
+
+HEADER = struct.Struct('<8sIIQ')
+TABLE = struct.Struct('<IIIIQQ')
+COLUMN = struct.Struct('<I1s3xQQ')
+
+CODES = {
+    'i': 'q',
+    'f': 'd',
+    'b': 'b',
+    's': 'I',
+    'r': 'I',
+}
+FORMATS = dict((kind, struct.Struct('<' + code)) for kind, code in CODES.items())
+ID = FORMATS['i']
+ROW = FORMATS['s']
+
+
+def _attributes(record):
+    """Returns attributes of a record (dict or BaseObject)"""
+    if isinstance(record, dict):
+        return(record)
+    return(record.__dict__)
+
+
+def _item_id(item):
+    """Returns id of an item of a list (resource dict/object or id)"""
+    value = get_value(item, 'id')
+    if value is None:
+        value = item
+    return(int(value))
+
+
+def _kind(values):
+    """Returns kind of a column from its values
+    Empty strings (values which were not decoded, see Schema) are
+    missing values in a column of numbers, booleans or lists.
+    A column with other strings is a column of strings"""
+    kinds = set()
+    for value in values:
+        if value is None or value == '':
+            continue
+        if isinstance(value, bool):
+            kinds.add('b')
+        elif isinstance(value, int):
+            kinds.add('i')
+        elif isinstance(value, float):
+            kinds.add('f')
+        elif isinstance(value, (list, tuple)):
+            kinds.add('r')
+        else:
+            kinds.add('s')
+    if not kinds:
+        return('s')
+    if len(kinds) == 1:
+        return(kinds.pop())
+    if kinds <= set(['b', 'i']):
+        return('i')
+    if kinds <= set(['b', 'i', 'f']):
+        return('f')
+    return('s')
+
+
+def _typed(value, types):
+    """Returns value if it is an instance of types (None otherwise)"""
+    if isinstance(value, types):
+        return(value)
+    return(None)
+
+
+class _Writer(object):
+    """Writes a snapshot file"""
+    def __init__(self):
+        self.buf = bytearray()
+        self.strings = []
+        self.string_index = {}
+
+    def string(self, s):
+        """Returns index of a string in string table"""
+        try:
+            return(self.string_index[s])
+        except KeyError:
+            i = len(self.strings)
+            self.strings.append(s)
+            self.string_index[s] = i
+            return(i)
+
+    def align(self):
+        self.buf.extend(b'\x00' * (-len(self.buf) % 8))
+
+    def reserve(self, size):
+        """Reserves size bytes and returns offset"""
+        self.align()
+        offset = len(self.buf)
+        self.buf.extend(b'\x00' * size)
+        return(offset)
+
+    def array(self, kind, values):
+        """Writes an array and returns offset"""
+        self.align()
+        offset = len(self.buf)
+        self.buf.extend(struct.pack('<%d%s' % (len(values), CODES[kind]), *values))
+        return(offset)
+
+    def column(self, kind, values):
+        """Writes a column and returns (data offset, extra offset)"""
+        if kind == 'i':
+            values = [_typed(v, int) for v in values]
+            values = [INT_NULL if v is None else int(v) for v in values]
+        elif kind == 'f':
+            values = [_typed(v, (int, float)) for v in values]
+            values = [float('nan') if v is None else float(v) for v in values]
+        elif kind == 'b':
+            values = [_typed(v, bool) for v in values]
+            values = [BOOL_NULL if v is None else int(v) for v in values]
+        elif kind == 's':
+            values = [STR_NULL if v is None else self.string(u'%s' % v) for v in values]
+        elif kind == 'r':
+            offsets = [0]
+            ids = []
+            for v in values:
+                if isinstance(v, (list, tuple)):
+                    ids.extend(_item_id(item) for item in v)
+                offsets.append(len(ids))
+            return((self.array('r', offsets), self.array('i', ids)))
+        return((self.array(kind, values), 0))
+
+    def table(self, name, records):
+        """Writes a table and returns its directory entry"""
+        records = [_attributes(record) for record in records]
+        names = []
+        for record in records:
+            for key in record.keys():
+                if key not in names:
+                    names.append(key)
+
+        descriptors = []
+        for key in names:
+            values = [record.get(key) for record in records]
+            kind = _kind(values)
+            data_offset, extra_offset = self.column(kind, values)
+            descriptors.append((self.string(key), kind.encode('ascii'), data_offset, extra_offset))
+        columns_offset = self.reserve(COLUMN.size * len(descriptors))
+        for i, descriptor in enumerate(descriptors):
+            COLUMN.pack_into(self.buf, columns_offset + i*COLUMN.size, *descriptor)
+
+        index_offset = 0
+        if 'id' in names:
+            index = []
+            for row, record in enumerate(records):
+                if record.get('id') is None:
+                    raise(ValueError("record %d of table '%s' has no id" % (row, name)))
+                index.append((int(record['id']), row))
+            index.sort()
+            index_offset = self.array('i', [i for i, row in index])
+            self.array('s', [row for i, row in index])
+        return((self.string(name), len(records), len(names), 0, columns_offset, index_offset))
+
+    def write(self, filename, tables):
+        header_size = HEADER.size + TABLE.size * len(tables)
+        self.buf.extend(b'\x00' * header_size)
+        entries = [self.table(name, records) for name, records in sorted(tables.items())]
+
+        strings = [s.encode('utf-8') for s in self.strings]
+        offsets = [0]
+        for s in strings:
+            offsets.append(offsets[-1] + len(s))
+        strings_offset = self.array('s', [len(strings)] + offsets)
+        for s in strings:
+            self.buf.extend(s)
+
+        HEADER.pack_into(self.buf, 0, MAGIC, VERSION, len(entries), strings_offset)
+        for i, entry in enumerate(entries):
+            TABLE.pack_into(self.buf, HEADER.size + i*TABLE.size, *entry)
+
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'wb') as fd:
+            fd.write(self.buf)
+        getattr(os, 'replace', os.rename)(tmp_filename, filename)  # workers never see a partial file
+
+
+def write_snapshot(filename, tables):
+    """Writes a snapshot file
+    tables is a dict: table name -> list of records (dict or objects)
+    A table is indexed by id if its records have an id
+    (raises ValueError if only some records have an id)"""
+    _Writer().write(filename, tables)
+
+
+def save_project(api, filename, project=None, categories=None):
+    """Writes a snapshot of resources, activities and events
+    of a project using an ADEWebAPI instance"""
+    tables = {}
+    if categories is None:
+        tables['resource'] = api.getResources(detail=13, project=project, decode=True)
+    else:
+        for category in categories:
+            tables[category] = api.getResources(category=category, detail=13,
+                project=project, decode=True)
+    tables['activity'] = api.getActivities(detail=17, project=project, decode=True)
+    tables['event'] = api.getEvents(detail=8, project=project, decode=True)
+    write_snapshot(filename, tables)
+
+
+class _Array(object):
+    """Read-only view of an array of a snapshot (usable with bisect)"""
+    def __init__(self, buf, fmt, offset, length):
+        self.buf = buf
+        self.fmt = fmt
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return(self.length)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.length
+        if not 0 <= i < self.length:
+            raise(IndexError(i))
+        return(self.fmt.unpack_from(self.buf, self.offset + i*self.fmt.size)[0])
+
+
+class SnapshotTable(object):
+    """Table of a snapshot (rows can be accessed by row number or by id)"""
+    def __init__(self, snapshot, name, nb_rows, nb_columns, columns_offset, index_offset):
+        self.snapshot = snapshot
+        self.name = name
+        self.nb_rows = nb_rows
+        buf = snapshot.buf
+        self.columns = {}  # name -> (kind, data array, extra array)
+        for i in range(nb_columns):
+            name_index, kind, data_offset, extra_offset = \
+                COLUMN.unpack_from(buf, columns_offset + i*COLUMN.size)
+            kind = kind.decode('ascii')
+            if kind == 'r':
+                offsets = _Array(buf, FORMATS['r'], data_offset, nb_rows + 1)
+                extra = _Array(buf, ID, extra_offset, offsets[nb_rows])
+                data = offsets
+            else:
+                data = _Array(buf, FORMATS[kind], data_offset, nb_rows)
+                extra = None
+            self.columns[snapshot.string(name_index)] = (kind, data, extra)
+        if index_offset:
+            self._ids = _Array(buf, ID, index_offset, nb_rows)
+            self._rows = _Array(buf, ROW, index_offset + ID.size*nb_rows, nb_rows)
+        else:
+            self._ids = None
+
+    def __len__(self):
+        return(self.nb_rows)
+
+    def __iter__(self):
+        for row in range(self.nb_rows):
+            yield(self[row])
+
+    def value(self, row, name):
+        """Returns value of a column for a given row (None if missing)"""
+        kind, data, extra = self.columns[name]
+        value = data[row]
+        if kind == 'i':
+            return(None if value == INT_NULL else value)
+        elif kind == 'f':
+            return(None if value != value else value)
+        elif kind == 'b':
+            return(None if value == BOOL_NULL else bool(value))
+        elif kind == 's':
+            return(None if value == STR_NULL else self.snapshot.string(value))
+        else:  # 'r'
+            return([extra[i] for i in range(value, data[row + 1])])
+
+    def __getitem__(self, row):
+        """Returns a row as a dict"""
+        if not 0 <= row < self.nb_rows:
+            raise(IndexError(row))
+        d = {}
+        for name in self.columns.keys():
+            value = self.value(row, name)
+            if value is not None:
+                d[name] = value
+        return(d)
+
+    def find(self, id):
+        """Returns row number of a given id (None if not found)"""
+        if self._ids is None:
+            raise(KeyError("table '%s' has no id index" % self.name))
+        id = int(id)
+        i = bisect.bisect_left(self._ids, id)
+        if i < self.nb_rows and self._ids[i] == id:
+            return(self._rows[i])
+        return(None)
+
+    def get(self, id, default=None):
+        """Returns row (dict) of a given id"""
+        row = self.find(id)
+        if row is None:
+            return(default)
+        return(self[row])
+
+    def column(self, name):
+        """Returns values of a column"""
+        return([self.value(row, name) for row in range(self.nb_rows)])
+
+
+class Snapshot(object):
+    """Read-only memory-mapped snapshot"""
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as fd:
+            self.buf = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, nb_tables, strings_offset = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise(Exception("'%s' is not a snapshot (version %d)" % (filename, VERSION)))
+        nb_strings = ROW.unpack_from(self.buf, strings_offset)[0]
+        self._string_offsets = _Array(self.buf, ROW, strings_offset + ROW.size, nb_strings + 1)
+        self._strings_data = strings_offset + ROW.size*(nb_strings + 2)
+        self.tables = {}
+        for i in range(nb_tables):
+            entry = TABLE.unpack_from(self.buf, HEADER.size + i*TABLE.size)
+            name_index, nb_rows, nb_columns, pad, columns_offset, index_offset = entry
+            name = self.string(name_index)
+            self.tables[name] = SnapshotTable(self, name, nb_rows, nb_columns,
+                columns_offset, index_offset)
+
+    def string(self, i):
+        """Returns string i of string table"""
+        start = self._strings_data + self._string_offsets[i]
+        end = self._strings_data + self._string_offsets[i + 1]
+        return(self.buf[start:end].decode('utf-8'))
+
+    def __getitem__(self, name):
+        return(self.tables[name])
+
+    def __contains__(self, name):
+        return(name in self.tables)
+
+    def close(self):
+        self.buf.close()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,72 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+
+"""
+    ADE Web API fake ADE Web API server for unit tests
+
+    Copyright (C) 2011-2015 "Sébastien Celles" <s.celles@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>
+"""
+
+from pyade import ADEWebAPI
+
+
+class FakeResponse(object):
+    def __init__(self, text):
+        self.text = text
+        self.content = text.encode('utf-8')
+
+
+def default_events(params, projectId):
+    return('<events><event id="1" week="%s"/></events>' % projectId)
+
+
+class FakeADEWebAPI(ADEWebAPI):
+    """ADEWebAPI with a fake server instead of HTTP requests
+
+    Sessions are checked (see expire) and get functions are answered using
+    responses: function -> callable(params, projectId) returning XML"""
+    def __init__(self, url='http://localhost/jsp/webapi', login='login', password='password', **kwargs):
+        ADEWebAPI.__init__(self, url, login, password, **kwargs)
+        self.nb_sessions = 0
+        self.projects = {}  # sessionId -> projectId (valid sessions)
+        self.calls = []  # params of every request
+        self.responses = {'getEvents': default_events}
+
+    def expire(self):
+        """Sessions expire on server side"""
+        self.projects.clear()
+
+    def _get(self, params):
+        self.calls.append(dict(params))
+        function = params['function']
+        if function == 'connect':
+            with self._lock:
+                self.nb_sessions += 1
+                sessionId = 's%d' % self.nb_sessions
+            self.projects[sessionId] = None
+            return(FakeResponse('<session id="%s"/>' % sessionId))
+        if params.get('sessionId') not in self.projects:
+            return(FakeResponse('<error name="SessionExpiredException" trace="session expired"/>'))
+        if function == 'disconnect':
+            del self.projects[params['sessionId']]
+            return(FakeResponse('<disconnected sessionId="%s"/>' % params['sessionId']))
+        if function == 'setProject':
+            self.projects[params['sessionId']] = params['projectId']
+            return(FakeResponse('<setProject sessionId="%s" projectId="%s"/>'
+                % (params['sessionId'], params['projectId'])))
+        if function in self.responses:
+            return(FakeResponse(self.responses[function](params, self.projects[params['sessionId']])))
+        raise(Exception("unexpected function %s" % function))
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+
+"""
+    ADE Web API availability unit tests
+
+    Copyright (C) 2011-2015 "Sébastien Celles" <s.celles@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>
+"""
+
+from xml.etree import ElementTree as ET
+
+from pyade import ADEWebAPI
+from pyade.availability import SlotGrid, AvailabilityIndex
+
+
+def test_slot_grid():
+    grid = SlotGrid(nb_days=7, nb_slots=48)
+    assert grid.slot(grid.position(2, 3, 10)) == (2, 3, 10)
+    mask = grid.mask_range(1, 0, 4, 3)
+    assert grid.slots(mask) == [(1, 0, 4), (1, 0, 5), (1, 0, 6)]
+    assert grid.mask_days([0, 1], [2], 0, 1) == grid.mask([(0, 2, 0), (0, 2, 1), (1, 2, 0), (1, 2, 1)])
+
+
+def test_availability_index():
+    grid = SlotGrid(nb_days=7, nb_slots=48)
+    index = AvailabilityIndex(grid)
+    index.add_resources([
+        {'id': '1', 'category': 'classroom', 'capacity': '30'},
+        {'id': '2', 'category': 'classroom', 'capacity': '50'},
+        {'id': '3', 'category': 'classroom', 'capacity': '60'},
+        {'id': '10', 'category': 'instructor'},
+    ])
+    index.add_events([
+        {'id': '100', 'week': '0', 'day': '0', 'slot': '16', 'duration': '4',
+         'resources': [{'id': '2'}, {'id': '10'}]},
+        {'id': '101', 'week': '0', 'day': '1', 'slot': '16', 'duration': '4',
+         'resources': [{'id': '3'}]},
+    ])
+
+    mask = grid.mask_range(0, 0, 18, 2)
+    assert index.free_resources(mask, category='classroom', min_capacity=40) == [3]
+    assert index.free_resources(mask, category='classroom') == [1, 3]
+    assert not index.is_free(10, mask)
+
+    mask = grid.mask_days([0], [0, 1], 16, 19)
+    assert grid.slots(index.common_free([2, 3], mask)) == []
+    assert len(grid.slots(index.any_free([2, 3], mask))) == 8
+    assert len(grid.slots(index.common_free([10], mask))) == 4
+
+
+def test_events_resources():
+    myade = ADEWebAPI('http://localhost/jsp/webapi', 'login', 'password')
+    element = ET.fromstring('<events><event id="1" week="2" day="3" slot="4" duration="2">'
+        '<resources><resource id="5" category="classroom"/></resources></event></events>')
+    events = list(myade._create_list_of('event', element.findall('event')))
+    assert events[0]['resources'] == [{'id': '5', 'category': 'classroom'}]
+
+    index = AvailabilityIndex()
+    index.add_events(events)
+    assert index.grid.slots(index.busy_mask(5)) == [(2, 3, 4), (2, 3, 5)]
+
+
+def test_slot_grid_range():
+    grid = SlotGrid(nb_days=7, nb_slots=48)
+    for week, day, slot in [(0, 0, 48), (0, 7, 0), (0, -1, 0), (-1, 0, 0)]:
+        try:
+            grid.position(week, day, slot)
+            assert False
+        except ValueError:
+            pass
+    try:
+        grid.mask_range(0, 0, 46, 4)  # runs into next day
+        assert False
+    except ValueError:
+        pass
+
+
+def test_slot_grid_from_events():
+    grid = SlotGrid.from_events([
+        {'id': '1', 'week': '0', 'day': '0', 'slot': '4', 'absoluteSlot': '4'},
+        {'id': '2', 'week': '1', 'day': '2', 'slot': '10', 'absoluteSlot': str((7 + 2)*120 + 10)},
+    ])
+    assert grid.nb_slots == 120
+    assert grid.position(1, 2, 10) == (7 + 2)*120 + 10
+    try:
+        SlotGrid.from_events([{'id': '1', 'week': '0', 'day': '0', 'slot': '4'}])
+        assert False
+    except ValueError:
+        pass
+
+
+def test_add_events_atomic():
+    grid = SlotGrid(nb_days=7, nb_slots=48)
+    index = AvailabilityIndex(grid)
+    try:
+        index.add_events([
+            {'id': '1', 'week': '0', 'day': '0', 'slot': '4', 'resources': [{'id': '1'}]},
+            {'id': '2', 'week': '0', 'day': '0', 'slot': '50', 'resources': [{'id': '2'}]},
+        ])
+        assert False
+    except ValueError:
+        pass
+    assert index.busy_mask(1) == 0
+    assert index.busy_mask(2) == 0
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+
+"""
+    ADE Web API conflicts unit tests
+
+    Copyright (C) 2011-2015 "Sébastien Celles" <s.celles@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>
+"""
+
+from pyade.availability import SlotGrid
+from pyade.conflict import ConflictDetector
+
+
+def event(event_id, day, slot, duration, *resource_ids):
+    return({'id': str(event_id), 'week': '0', 'day': str(day), 'slot': str(slot),
+        'duration': str(duration),
+        'resources': [{'id': str(r), 'category': 'classroom' if r < 10 else 'instructor'}
+            for r in resource_ids]})
+
+
+def test_conflicts():
+    grid = SlotGrid(nb_days=7, nb_slots=48)
+    detector = ConflictDetector(grid)
+    detector.update([
+        event(1, 0, 16, 4, 1, 10),
+        event(2, 0, 18, 4, 1),
+        event(3, 0, 20, 2, 1, 10),
+        event(4, 1, 16, 4, 1),
+    ])
+    conflicts = detector.conflicts()
+    assert [(c.resource_id, c.event_id, c.other_event_id) for c in conflicts] == [(1, 1, 2), (1, 2, 3)]
+    assert conflicts[0].start == grid.position(0, 0, 18)
+    assert conflicts[0].end == grid.position(0, 0, 20)
+    assert detector.conflicts(category='instructor') == []
+
+    # incremental update
+    detector.update([event(3, 0, 19, 2, 1, 10)])
+    conflicts = detector.conflicts(category='instructor')
+    assert [(c.resource_id, c.event_id, c.other_event_id) for c in conflicts] == [(10, 1, 3)]
+
+    detector.remove_event(2)
+    conflicts = detector.conflicts()
+    assert [(c.resource_id, c.event_id, c.other_event_id) for c in conflicts] == [(1, 1, 3), (10, 1, 3)]
+
+
+def test_out_of_range_slot():
+    grid = SlotGrid(nb_days=7, nb_slots=48)
+    detector = ConflictDetector(grid)
+    detector.add_event(event(1, 1, 2, 4, 1))
+    # slot 50 of day 0 would be slot 2 of day 1 without range check
+    try:
+        detector.add_event(event(2, 0, 50, 4, 1))
+        assert False
+    except ValueError:
+        pass
+    assert detector.conflicts() == []
+    assert 2 not in detector.events
+
+
+def test_zero_duration():
+    grid = SlotGrid(nb_days=7, nb_slots=48)
+    detector = ConflictDetector(grid)
+    detector.add_event(event(1, 0, 16, 4, 1))
+    try:
+        detector.add_event(event(2, 0, 18, 0, 1))
+        assert False
+    except ValueError:
+        pass
+    assert detector.conflicts() == []
@@ -0,0 +1,107 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+
+"""
+    ADE Web API identity map unit tests
+
+    Copyright (C) 2011-2015 "Sébastien Celles" <s.celles@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>
+"""
+
+import pytest
+
+from pyade import Room, Event
+
+from fake_ade import FakeADEWebAPI
+
+
+def events(params, projectId):
+    return('<events>'
+        '<event id="1" week="0"><resources><resource id="10" category="room"/>'
+        '<resource id="20" category="instructor"/></resources></event>'
+        '<event id="2" week="1"><resources><resource id="10" category="room"/>'
+        '<resource id="30" category="trainee"/></resources></event>'
+        '</events>')
+
+
+def resources(params, projectId):
+    ids = [id for id in str(params['id']).split('|') if id != '30']
+    return('<resources>%s</resources>' % ''.join(
+        '<resource id="%s" category="room" name="R%s" capacity="40"/>' % (id, id)
+        for id in ids))
+
+
+def get_calls(myade):
+    return([c for c in myade.calls if c['function'].startswith('get')])
+
+
+def test_identity_map():
+    myade = FakeADEWebAPI()
+    myade.responses.update({'getEvents': events, 'getResources': resources})
+    myade.connect()
+    identity_map = myade.identity_map()
+    assert myade.identity_map() is identity_map
+
+    events1 = identity_map.getEvents(detail=8)
+    assert [c['function'] for c in get_calls(myade)] == ['getEvents', 'getResources']
+    assert get_calls(myade)[1]['id'] == '10|20|30'
+    assert isinstance(events1[0], Event)
+
+    room = events1[0].resources[0]
+    assert isinstance(room, Room)
+    assert room is events1[1].resources[0]
+    assert room['name'] == 'R10'
+    assert events1[1].resources[1]['id'] == '30'  # not found on server
+
+    del myade.calls[:]
+    assert identity_map.getEvents(detail=8)[0] is events1[0]
+    assert [c['function'] for c in get_calls(myade)] == ['getEvents']
+    assert identity_map.getResources(id=10)[0] is room
+
+
+def test_identity_map_update():
+    myade = FakeADEWebAPI()
+    myade.responses.update({'getEvents': events, 'getResources': resources})
+    myade.connect()
+    identity_map = myade.identity_map()
+    event = identity_map.getEvents(detail=8)[0]
+
+    seen = []
+
+    def fetch_resources(params, projectId):
+        # event is updated only once its new resources are resolved
+        seen.append([r['id'] for r in event.resources])
+        assert all(isinstance(r, Room) for r in event.resources)
+        return(resources(params, projectId))
+
+    myade.responses['getEvents'] = lambda params, projectId: (
+        '<events><event id="1" week="0"><resources><resource id="40" category="room"/>'
+        '</resources></event></events>')
+    myade.responses['getResources'] = fetch_resources
+    assert identity_map.getEvents(detail=8)[0] is event
+    assert seen == [['10', '20']]
+    assert [r['name'] for r in event.resources] == ['R40']
+
+
+def test_identity_map_options():
+    myade = FakeADEWebAPI()
+    myade.responses.update({'getEvents': events, 'getResources': resources})
+    identity_map = myade.identity_map(project=5)
+    with pytest.raises(TypeError):
+        identity_map.getEvents(project=6)
+    with pytest.raises(TypeError):
+        identity_map.getResources(objects=True)
+    assert len(identity_map.getEvents(detail=8)) == 2
+    assert myade.projects[get_calls(myade)[0]['sessionId']] == '5'
@@ -0,0 +1,271 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+
+"""
+    ADE Web API caching proxy unit tests
+
+    Copyright (C) 2011-2015 "Sébastien Celles" <s.celles@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>
+"""
+
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from urllib.parse import urlparse, parse_qsl
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from urlparse import urlparse, parse_qsl
+
+from xml.etree import ElementTree as ET
+
+from pyade import ADEWebAPI
+from pyade.proxy import ADEProxy, ADEProxyServer, ResponseCache
+
+
+class FakeADEHandler(BaseHTTPRequestHandler):
+    """Minimal ADE Web API server"""
+    passwords = {}  # login -> password
+    sessions = {}  # sessionId -> [login, projectId]
+    calls = []
+    delay = 0
+
+    def reply(self, params):
+        function = params['function']
+        if function == 'connect':
+            if self.passwords.get(params['login']) != params['password']:
+                return('<error name="LoginError" trace="bad password"/>')
+            sessionId = 's%d' % len(self.calls)
+            self.sessions[sessionId] = [params['login'], None]
+            return('<session id="%s"/>' % sessionId)
+        session = self.sessions.get(params.get('sessionId'))
+        if session is None:
+            return('<error name="SessionExpiredException" trace="session expired"/>')
+        if function == 'disconnect':
+            del self.sessions[params['sessionId']]
+            return('<disconnected sessionId="%s"/>' % params['sessionId'])
+        if function == 'setProject':
+            if params['projectId'] == '99':
+                return('<error name="NotFoundException" trace="Project not found"/>')
+            session[1] = params['projectId']
+            return('<setProject sessionId="%s" projectId="%s"/>'
+                % (params['sessionId'], params['projectId']))
+        time.sleep(self.delay)
+        return('<events><event id="1" name="%s" week="%s"/></events>' % (session[0], session[1]))
+
+    def do_GET(self):
+        params = dict(parse_qsl(urlparse(self.path).query))
+        self.calls.append(params['function'])
+        body = self.reply(params).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(server):
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+
+class Upstream(object):
+    """Fake ADE server running in a thread"""
+    def __enter__(self):
+        FakeADEHandler.passwords = {'login': 'password', 'other': 'secret'}
+        FakeADEHandler.sessions = {}
+        FakeADEHandler.calls = []
+        FakeADEHandler.delay = 0
+        self.server = HTTPServer(('127.0.0.1', 0), FakeADEHandler)
+        serve(self.server)
+        self.url = 'http://127.0.0.1:%d/jsp/webapi' % self.server.server_address[1]
+        return(self)
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def connect(proxy, login='login', password='password', projectId=5):
+    element = ET.fromstring(proxy.handle({'function': 'connect',
+        'login': login, 'password': password})[1])
+    sessionId = element.attrib['id']
+    if projectId is not None:
+        proxy.handle({'function': 'setProject', 'sessionId': sessionId, 'projectId': projectId})
+    return(sessionId)
+
+
+def get_events(proxy, sessionId):
+    return(ET.fromstring(proxy.handle({'function': 'getEvents', 'sessionId': sessionId,
+        'resources': '1'})[1]))
+
+
+def test_proxy():
+    with Upstream() as upstream:
+        proxy = ADEProxy(upstream.url, size=2)
+        server = ADEProxyServer(proxy, '127.0.0.1', 0)
+        serve(server)
+        proxy_url = 'http://127.0.0.1:%d/' % server.server_address[1]
+
+        try:
+            myade = ADEWebAPI(proxy_url, 'login', 'wrong')
+            try:
+                myade.connect()
+                assert False
+            except Exception as e:
+                assert 'Invalid login' in str(e)
+
+            myade = ADEWebAPI(proxy_url, 'login', 'password')
+            assert myade.connect()
+            assert myade.setProject(5)
+            del FakeADEHandler.calls[:]
+            for i in range(3):
+                events = myade.getEvents(resources=1)
+                assert events == [{'id': '1', 'name': 'login', 'week': '5'}]
+            assert FakeADEHandler.calls.count('getEvents') == 1
+            assert myade.disconnect()
+        finally:
+            server.shutdown()
+            server.server_close()
+            proxy.close()
+
+
+def test_no_project():
+    with Upstream() as upstream:
+        proxy = ADEProxy(upstream.url)
+        sessionId = connect(proxy, projectId=None)
+        element = get_events(proxy, sessionId)
+        assert element.tag == 'error'
+        assert 'No project' in element.attrib['trace']
+        assert 'getEvents' not in FakeADEHandler.calls
+        proxy.close()
+
+
+def test_logins():
+    with Upstream() as upstream:
+        proxy = ADEProxy(upstream.url)
+        assert get_events(proxy, connect(proxy))[0].attrib['name'] == 'login'
+        assert get_events(proxy, connect(proxy, 'other', 'secret'))[0].attrib['name'] == 'other'
+        assert FakeADEHandler.calls.count('getEvents') == 2  # not shared between logins
+        proxy.close()
+
+
+def test_coalescing():
+    with Upstream() as upstream:
+        FakeADEHandler.delay = 0.3
+        proxy = ADEProxy(upstream.url, size=4)
+        sessionIds = [connect(proxy) for i in range(10)]
+        results = []
+
+        def worker(sessionId):
+            results.append(get_events(proxy, sessionId)[0].attrib['week'])
+
+        threads = [threading.Thread(target=worker, args=(sessionId,)) for sessionId in sessionIds]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == ['5']*10
+        assert FakeADEHandler.calls.count('getEvents') == 1
+        proxy.close()
+
+
+def test_session_expired():
+    with Upstream() as upstream:
+        proxy = ADEProxy(upstream.url, size=1, ttl=None)
+        sessionId = connect(proxy)
+        assert get_events(proxy, sessionId)[0].attrib['week'] == '5'
+        FakeADEHandler.sessions.clear()  # sessions expire on server side
+        proxy.cache.clear()
+        assert get_events(proxy, sessionId)[0].attrib['week'] == '5'
+        proxy.close()
+
+
+def test_auth_ttl():
+    with Upstream() as upstream:
+        proxy = ADEProxy(upstream.url, auth_ttl=0)
+        sessionId = connect(proxy)
+        assert get_events(proxy, sessionId).tag == 'events'
+        FakeADEHandler.passwords['login'] = 'changed'
+        element = get_events(proxy, sessionId)
+        assert element.tag == 'error'
+        assert get_events(proxy, sessionId).attrib['trace'].startswith('Invalid session')
+        proxy.close()
+
+
+def test_virtual_session_ttl():
+    with Upstream() as upstream:
+        proxy = ADEProxy(upstream.url, session_ttl=0.1)
+        sessionId = connect(proxy)
+        time.sleep(0.2)
+        assert get_events(proxy, sessionId).attrib['trace'].startswith('Invalid session')
+        proxy.close()
+
+
+def test_cache():
+    cache = ResponseCache(ttl=0.1, max_size=2)
+    cache.set(('login', '5'), 'a', 1)
+    assert cache.get(('login', '5'), 'a') == 1
+    assert cache.get(('other', '5'), 'a') is None
+    time.sleep(0.2)
+    assert cache.get(('login', '5'), 'a') is None
+
+    cache.set(('login', '5'), 'a', 1)
+    time.sleep(0.2)
+    cache.set(('login', '5'), 'b', 2)
+    assert len(cache) == 1  # expired responses are removed
+
+    cache.set(('login', '5'), 'c', 3)
+    cache.set(('login', '5'), 'd', 4)
+    assert len(cache) == 2
+    assert cache.get(('login', '5'), 'b') is None
+
+
+def test_session_expired_set_project():
+    with Upstream() as upstream:
+        proxy = ADEProxy(upstream.url, size=1, ttl=None)
+        sessionId5 = connect(proxy, projectId=5)
+        sessionId6 = connect(proxy, projectId=6)
+        assert get_events(proxy, sessionId5)[0].attrib['week'] == '5'
+        FakeADEHandler.sessions.clear()  # sessions expire on server side
+        # pooled session must be set to project 6 (and is expired)
+        assert get_events(proxy, sessionId6)[0].attrib['week'] == '6'
+        proxy.close()
+
+
+def test_set_project():
+    with Upstream() as upstream:
+        proxy = ADEProxy(upstream.url)
+        sessionId = connect(proxy, projectId=None)
+        element = ET.fromstring(proxy.handle({'function': 'setProject',
+            'sessionId': sessionId, 'projectId': '99'})[1])
+        assert element.tag == 'error'
+        assert 'Project not found' in element.attrib['trace']
+        element = ET.fromstring(proxy.handle({'function': 'setProject',
+            'sessionId': sessionId})[1])
+        assert element.tag == 'error'
+        assert get_events(proxy, sessionId).attrib['trace'].startswith('No project')
+
+        FakeADEHandler.sessions.clear()
+        element = ET.fromstring(proxy.handle({'function': 'setProject',
+            'sessionId': sessionId, 'projectId': '6'})[1])
+        assert element.tag == 'setProject'
+        assert get_events(proxy, sessionId)[0].attrib['week'] == '6'
+        proxy.close()
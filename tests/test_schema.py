@@ -0,0 +1,65 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+
+"""
+    ADE Web API schema unit tests
+
+    Copyright (C) 2011-2015 "Sébastien Celles" <s.celles@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>
+"""
+
+from xml.etree import ElementTree as ET
+
+from pyade import ADEWebAPI
+from pyade.schema import Schema
+
+
+def test_schema_decode():
+    schema = Schema()
+    d = schema.decode('event', {'id': '12', 'week': '3', 'day': '1', 'slot': '32',
+        'duration': '8', 'name': 'Maths', 'isLockPosition': 'false'})
+    assert d == {'id': 12, 'week': 3, 'day': 1, 'slot': 32,
+        'duration': 8, 'name': 'Maths', 'isLockPosition': False}
+
+
+def test_schema_intern():
+    schema = Schema()
+    category = ''.join(['clas', 'sroom'])
+    r1 = schema.decode('classroom', {'id': '1', 'category': category, 'capacity': '40'})
+    r2 = schema.decode('classroom', {'id': '2', 'category': 'classroom', 'capacity': ''})
+    assert r1['category'] is r2['category']
+    assert r1['capacity'] == 40
+    assert r2['capacity'] == ''  # not decodable => kept as str
+
+
+def test_decode_attributes():
+    myade = ADEWebAPI('http://localhost/jsp/webapi', 'login', 'password')
+    element = ET.fromstring('<events><event id="1" week="2" day="3" slot="4"/></events>')
+    events = list(myade._create_list_of('event', element.findall('event')))
+    assert events == [{'id': '1', 'week': '2', 'day': '3', 'slot': '4'}]
+
+    myade.decode_attributes(True)
+    myade.create_list_of_objects(True)
+    events = list(myade._create_list_of('event', element.findall('event')))
+    assert events[0]['week'] == 2
+
+
+def test_schema_bool():
+    schema = Schema()
+    d = schema.decode('event', {'isLockPosition': 'TRUE', 'isLockResources': 'false',
+        'isSoftKeepResources': ''})
+    assert d == {'isLockPosition': True, 'isLockResources': False, 'isSoftKeepResources': ''}
+    d = schema.decode('resource', {'isGroup': '1', 'consumer': 'yes'})
+    assert d == {'isGroup': '1', 'consumer': 'yes'}  # not decodable => kept as str
@@ -0,0 +1,159 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+
+"""
+    ADE Web API snapshot unit tests
+
+    Copyright (C) 2011-2015 "Sébastien Celles" <s.celles@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>
+"""
+
+import os
+import tempfile
+import shutil
+
+import pytest
+
+from pyade import Room
+from pyade.snapshot import Snapshot, write_snapshot, save_project
+
+from fake_ade import FakeADEWebAPI
+
+
+def test_snapshot():
+    tmpdir = tempfile.mkdtemp()
+    filename = os.path.join(tmpdir, 'project.snapshot')
+    try:
+        write_snapshot(filename, {
+            'resource': [
+                {'id': 12, 'name': u'BC-138', 'category': 'classroom', 'capacity': 40, 'isGroup': False},
+                Room(id=3, name=u'Amphi Élie', category='classroom'),
+            ],
+            'event': [
+                {'id': 7, 'week': 2, 'day': 1, 'slot': 32, 'duration': 8,
+                 'resources': [{'id': 12}, {'id': 3}]},
+                {'id': 5, 'week': 3, 'day': 0, 'slot': 16, 'duration': 4, 'resources': []},
+            ],
+        })
+
+        with Snapshot(filename) as snapshot:
+            resources = snapshot['resource']
+            assert len(resources) == 2
+            assert resources.get(12) == {'id': 12, 'name': u'BC-138', 'category': 'classroom',
+                'capacity': 40, 'isGroup': False}
+            assert resources.get(3) == {'id': 3, 'name': u'Amphi Élie', 'category': 'classroom'}
+            assert resources.get(4) is None
+
+            events = snapshot['event']
+            assert events.get(7)['resources'] == [12, 3]
+            assert events.get(5)['resources'] == []
+            assert events.column('week') == [2, 3]
+            assert events.value(events.find(5), 'slot') == 16
+            assert 'activity' not in snapshot
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_snapshot_undecoded_values():
+    tmpdir = tempfile.mkdtemp()
+    filename = os.path.join(tmpdir, 'project.snapshot')
+    try:
+        write_snapshot(filename, {'resource': [
+            {'id': 1, 'capacity': 40, 'isGroup': True, 'duration': 1.5},
+            {'id': 2, 'capacity': '', 'isGroup': 'yes', 'duration': 2},
+            {'id': 3, 'name': 'R3'},
+        ]})
+        with Snapshot(filename) as snapshot:
+            resources = snapshot['resource']
+            assert resources.column('capacity') == [40, None, None]
+            assert resources.column('isGroup') == ['True', 'yes', None]
+            assert resources.column('duration') == [1.5, 2.0, None]
+            assert resources.columns['capacity'][0] == 'i'
+            assert resources.columns['isGroup'][0] == 's'
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_snapshot_mostly_strings():
+    tmpdir = tempfile.mkdtemp()
+    filename = os.path.join(tmpdir, 'project.snapshot')
+    try:
+        write_snapshot(filename, {'resource': [
+            {'id': 1, 'name': 'Amphi A', 'code': ''},
+            {'id': 2, 'name': 'Amphi B', 'code': 'B'},
+            {'id': 3, 'name': 2020, 'code': 7},
+        ]})
+        with Snapshot(filename) as snapshot:
+            resources = snapshot['resource']
+            assert resources.column('name') == ['Amphi A', 'Amphi B', '2020']
+            assert resources.column('code') == ['', 'B', '7']
+            assert resources.columns['name'][0] == 's'
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_snapshot_missing_id():
+    tmpdir = tempfile.mkdtemp()
+    filename = os.path.join(tmpdir, 'project.snapshot')
+    try:
+        with pytest.raises(ValueError):
+            write_snapshot(filename, {'resource': [{'id': 1, 'name': 'R1'}, {'name': 'R2'}]})
+        write_snapshot(filename, {'date': [{'week': 1, 'day': 2}]})
+        with Snapshot(filename) as snapshot:
+            with pytest.raises(KeyError):
+                snapshot['date'].find(1)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_save_project():
+    tmpdir = tempfile.mkdtemp()
+    filename = os.path.join(tmpdir, 'project.snapshot')
+    myade = FakeADEWebAPI()
+    myade.responses['getResources'] = lambda params, projectId: (
+        '<resources><%s id="%s" category="room" name="R" capacity="40"/></resources>'
+        % (params.get('category', 'resource'), projectId))
+    myade.responses['getActivities'] = lambda params, projectId: (
+        '<activities><activity id="5" name="A" duration="1.5"/></activities>')
+    myade.responses['getEvents'] = lambda params, projectId: (
+        '<events><event id="7" name="E" week="%s" day="1" slot="32" duration="8"/></events>'
+        % projectId)
+    try:
+        myade.connect()
+        save_project(myade, filename, project=4)
+        with Snapshot(filename) as snapshot:
+            assert sorted(snapshot.tables) == ['activity', 'event', 'resource']
+            assert snapshot['resource'].get(4) == {'id': 4, 'category': 'room', 'name': 'R', 'capacity': 40}
+            assert snapshot['activity'].column('duration') == [1.5]
+            assert snapshot['event'].get(7)['week'] == 4
+
+        save_project(myade, filename, project=9, categories=['trainee', 'room'])
+        with Snapshot(filename) as snapshot:
+            assert sorted(snapshot.tables) == ['activity', 'event', 'room', 'trainee']
+            assert snapshot['trainee'].column('id') == [9]
+            assert snapshot['room'].column('id') == [9]
+
+        calls = [(c['function'], c.get('category'), c.get('detail'))
+            for c in myade.calls if c['function'].startswith('get')]
+        assert calls == [
+            ('getResources', None, 13), ('getActivities', None, 17), ('getEvents', None, 8),
+            ('getResources', 'trainee', 13), ('getResources', 'room', 13),
+            ('getActivities', None, 17), ('getEvents', None, 8),
+        ]
+        assert myade.sessionId not in [c.get('sessionId') for c in myade.calls
+            if c['function'].startswith('get')]
+    finally:
+        myade.disconnect()
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,135 @@
+#!/usr/bin/python
+# -*- coding: utf8 -*-
+
+"""
+    ADE Web API thread-safety unit tests
+
+    Copyright (C) 2011-2015 "Sébastien Celles" <s.celles@gmail.com>
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>
+"""
+
+import threading
+
+from pyade import Event
+
+from fake_ade import FakeResponse, FakeADEWebAPI
+
+
+def test_per_call_options():
+    myade = FakeADEWebAPI('http://localhost/jsp/webapi', 'login', 'password')
+    myade.connect()
+
+    events = myade.getEvents(project=5)
+    assert events == [{'id': '1', 'week': '5'}]
+    events = myade.getEvents(project=6, objects=True, decode=True)
+    assert isinstance(events[0], Event)
+    assert events[0]['week'] == 6
+    assert myade.nb_sessions == 3
+
+
+def test_threads():
+    myade = FakeADEWebAPI('http://localhost/jsp/webapi', 'login', 'password')
+    myade.connect()
+    results = {}
+
+    def worker(i):
+        project = i % 2 + 5
+        results[i] = (project, myade.getEvents(project=project, decode=True))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert myade.nb_sessions == 3  # main session and one session per project
+    for project, events in results.values():
+        assert events == [{'id': 1, 'week': project}]
+
+
+class FailingADEWebAPI(FakeADEWebAPI):
+    """Fake server which refuses project 7"""
+    def __init__(self, *args, **kwargs):
+        FakeADEWebAPI.__init__(self, *args, **kwargs)
+        self.disconnected = []
+
+    def _get(self, params):
+        if params['function'] == 'setProject' and params['projectId'] == '7':
+            return(FakeResponse('<error name="NotFoundException" trace="Project not found"/>'))
+        if params['function'] == 'disconnect':
+            self.disconnected.append(params['sessionId'])
+        return(FakeADEWebAPI._get(self, params))
+
+
+def test_failed_project_session():
+    myade = FailingADEWebAPI('http://localhost/jsp/webapi', 'login', 'password')
+    try:
+        myade.getEvents(project=7)
+        assert False
+    except Exception as e:
+        assert 'Project not found' in str(e)
+    assert myade.disconnected == ['s1']  # session opened for project 7 is closed
+    assert myade.getEvents(project=5) == [{'id': '1', 'week': '5'}]
+
+
+def test_login_outside_lock():
+    myade = FakeADEWebAPI('http://localhost/jsp/webapi', 'login', 'password')
+    logging_in = threading.Event()
+    release = threading.Event()
+    get = myade._get
+
+    def slow_get(params):
+        if params['function'] == 'connect':
+            logging_in.set()
+            release.wait(5)
+        return(get(params))
+
+    myade._get = slow_get
+    thread = threading.Thread(target=myade.getEvents, kwargs={'project': 5})
+    thread.start()
+    assert logging_in.wait(5)
+    # instance lock is not held during login of project 5
+    assert myade._lock.acquire(False)
+    myade._lock.release()
+    assert myade.identity_map(project=6) is not None
+    release.set()
+    thread.join()
+
+
+def test_expired_project_session():
+    myade = FakeADEWebAPI('http://localhost/jsp/webapi', 'login', 'password')
+    assert myade.getEvents(project=5) == [{'id': '1', 'week': '5'}]
+    myade.expire()
+    assert myade.getEvents(project=5) == [{'id': '1', 'week': '5'}]
+    assert myade.getEvents(project=5) == [{'id': '1', 'week': '5'}]
+    assert myade.nb_sessions == 2
+
+
+def test_disconnect():
+    myade = FakeADEWebAPI('http://localhost/jsp/webapi', 'login', 'password')
+    myade.getEvents(project=5)  # never connected (only project sessions)
+    myade.identity_map(project=5)
+    assert myade.disconnect()
+    assert myade.projects == {}
+    assert myade._identity_maps == {}
+
+    myade.connect()
+    myade.getEvents(project=5)
+    myade.getEvents(project=6)
+    session5 = myade._project_sessions['5']
+    del myade.projects[session5]  # session of project 5 expired on server side
+    assert myade.disconnect()
+    assert myade.projects == {}  # session of project 6 and main session are disconnected
+    assert myade.sessionId is None